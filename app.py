@@ -6,16 +6,23 @@ multi-food plate estimates, daily logging, history, weekly summary,
 and smart coaching.
 """
 
+import io
 import os
+import json
+import uuid
+import sqlite3
+import hashlib
+import threading
 from datetime import datetime, date, timedelta
+from itertools import islice
 
 import streamlit as st
-from PIL import Image
 from dotenv import load_dotenv
-import pandas as pd
+import numpy as np
 
-from food_recognition import recognize_food_advanced, validate_food_image
-from nutrition_api import get_nutrition_info
+from coach import coach_message
+from food_recognition import analyze_food
+from nutrition_api import get_nutrition_info, get_nutrition_info_many
 from recommendations import get_meal_recommendations, get_healthier_alternatives
 
 # Load environment variables from .env (for local dev)
@@ -28,184 +35,273 @@ st.set_page_config(
     layout="wide"
 )
 
-# --- Session state for logs (lives for current browser session) ---
+# --- Dates for this rerun (YYYY-MM-DD strings compare chronologically) ---
+TODAY = date.today()
+TODAY_STR = TODAY.isoformat()
+WEEK_START_STR = (TODAY - timedelta(days=6)).isoformat()
+
+# --- Meal log storage ---
+# Meals are persisted in a local SQLite file so the log survives browser
+# refreshes; each session keeps an in-memory copy loaded from it. Rows are
+# keyed by a per-user id kept in the URL (?uid=...), so visitors sharing one
+# deployment never see each other's meals.
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scaneat.db")
+MEAL_FIELDS = (
+    "date", "time", "foods", "calories", "protein",
+    "carbs", "fat", "fiber", "portion", "goal", "image",
+)
+
+
+@st.cache_resource
+def _db():
+    # One connection shared by all sessions; hold the lock from _db_lock()
+    # around every query and transaction on it.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.executescript(
+        "CREATE TABLE IF NOT EXISTS meals ("
+        "user_id TEXT, date TEXT, time TEXT, foods TEXT, calories INT, protein REAL, "
+        "carbs REAL, fat REAL, fiber REAL, portion REAL, goal TEXT, image BLOB);"
+    )
+    # Databases from before per-user logs: their rows keep a NULL user_id
+    # and are not shown to anyone.
+    if "user_id" not in {r[1] for r in conn.execute("PRAGMA table_info(meals)")}:
+        conn.execute("ALTER TABLE meals ADD COLUMN user_id TEXT")
+    conn.executescript(
+        "DROP INDEX IF EXISTS i_date;"
+        "CREATE INDEX IF NOT EXISTS i_user_date ON meals(user_id, date);"
+    )
+    return conn
+
+
+@st.cache_resource
+def _db_lock():
+    return threading.Lock()
+
+
+def _user_id() -> str:
+    """Stable id for this visitor, kept in the URL so a refresh or bookmark keeps the log."""
+    uid = st.session_state.get("user_id") or st.query_params.get("uid") or uuid.uuid4().hex
+    st.session_state["user_id"] = uid
+    if st.query_params.get("uid") != uid:
+        st.query_params["uid"] = uid
+    return uid
+
+
+def _load_log_entries(user_id: str):
+    with _db_lock():
+        rows = _db().execute(
+            f"SELECT {', '.join(MEAL_FIELDS)} FROM meals WHERE user_id = ? ORDER BY rowid",
+            (user_id,),
+        ).fetchall()
+    entries = []
+    for row in rows:
+        e = dict(zip(MEAL_FIELDS, row))
+        e["foods"] = json.loads(e["foods"])
+        e["foods_display"] = [f.title() for f in e["foods"]]
+        e["image_bytes"] = e.pop("image")
+        entries.append(e)
+    return entries
+
+
+def _save_log_entry(user_id: str, entry: dict):
+    row = {**entry, "foods": json.dumps(entry["foods"]), "image": entry.get("image_bytes")}
+    conn = _db()
+    with _db_lock(), conn:
+        conn.execute(
+            f"INSERT INTO meals (user_id, {', '.join(MEAL_FIELDS)}) "
+            f"VALUES (?, {', '.join('?' * len(MEAL_FIELDS))})",
+            (user_id, *(row[k] for k in MEAL_FIELDS)),
+        )
+
+
+# Each entry:
+# {
+#   "date": "YYYY-MM-DD",
+#   "time": "HH:MM",
+#   "foods": ["pizza", "salad"],
+#   "foods_display": ["Pizza", "Salad"],
+#   "calories": int,
+#   "protein": float,
+#   "carbs": float,
+#   "fat": float,
+#   "fiber": float,
+#   "portion": float,
+#   "goal": "lose/maintain/gain",
+#   "image_bytes": bytes (~256 px JPEG thumbnail)
+# }
+
+# Columnar mirror of the log: a date array plus one (meals x nutrients) matrix,
+# so any set of totals is a single vectorized reduction over masked rows.
+LOG_NUMERIC = ("calories", "protein", "carbs", "fat", "fiber")
+
+
+def _log_columns(entries):
+    return {
+        "date": np.array([e["date"] for e in entries], dtype="U10"),
+        "macros": np.array(
+            [[e[k] for k in LOG_NUMERIC] for e in entries], dtype=np.float64
+        ).reshape(-1, len(LOG_NUMERIC)),
+    }
+
+
+USER_ID = _user_id()
+
+# Loading touches the database, so do it only once per browser session
 if "log_entries" not in st.session_state:
-    # Each entry:
-    # {
-    #   "date": "YYYY-MM-DD",
-    #   "time": "HH:MM",
-    #   "foods": ["pizza", "salad"],
-    #   "calories": int,
-    #   "protein": float,
-    #   "carbs": float,
-    #   "fat": float,
-    #   "fiber": float,
-    #   "portion": float,
-    #   "goal": "lose/maintain/gain",
-    #   "image": PIL.Image (small copy)
-    # }
-    st.session_state["log_entries"] = []
+    _entries = _load_log_entries(USER_ID)
+    st.session_state["log_entries"] = _entries
+    st.session_state["log_cols"] = _log_columns(_entries)
+
+
+# --- Helper: downscale once before detection / logging ---
+def _prep(img, max_side=512):
+    from PIL import Image
+
+    # convert() returns a copy, so thumbnail() never touches the caller's image
+    img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    return img
+
+
+# --- Helper: small JPEG thumbnail for the log (bytes are far lighter than a PIL image) ---
+def _thumbnail_jpeg(img, max_side=256) -> bytes:
+    buf = io.BytesIO()
+    _prep(img, max_side).save(buf, format="JPEG", quality=78, optimize=True)
+    return buf.getvalue()
+
+
+# --- Cached lookups (shared across reruns and sessions in this process) ---
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_nutrition_hit(name: str):
+    # A miss (or an Open Food Facts error) raises, so st.cache_data never
+    # stores it and the next rerun asks again.
+    nutrition = get_nutrition_info(name.lower().strip())
+    if nutrition is None:
+        raise LookupError(name)
+    return nutrition
+
+
+def _cached_nutrition(name: str):
+    try:
+        return _cached_nutrition_hit(name)
+    except LookupError:
+        return None
+
+
+# Nutrients summed across the selected plate items
+PLATE_NUTRIENTS = ("calories", "protein", "carbs", "fat", "fiber")
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _bulk_nutrition_hit(items: tuple):
+    # Callers pass a sorted tuple so the same plate shares one cache entry.
+    # A plate with any miss raises (carrying the partial results) so it is
+    # not cached and the missing items are retried on the next rerun.
+    results = get_nutrition_info_many([i.lower().strip() for i in items])
+    if any(r is None for r in results):
+        raise LookupError(results)
+    return results
+
+
+def _bulk_nutrition(items: tuple):
+    try:
+        return _bulk_nutrition_hit(items)
+    except LookupError as e:
+        return e.args[0]
+
+
+def _nutrition_sig(nutrition: dict) -> tuple:
+    # Scalar fields only: that's all the recommendation rules read, and a flat
+    # tuple hashes far cheaper than the nested vitamins/minerals dicts.
+    return tuple(sorted((k, v) for k, v in nutrition.items() if not isinstance(v, dict)))
+
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def _cached_recs(food: str, goal: str, nutrition_sig: tuple):
+    return get_meal_recommendations(food, dict(nutrition_sig), goal)
+
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def _cached_alternatives(food: str):
+    return get_healthier_alternatives(food)
+
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _cached_detect(image_key: str, _image):
+    # `image_key` is the SHA-1 of the image bytes; the leading underscore
+    # tells Streamlit not to hash the PIL object itself. API failures raise,
+    # so they are never cached and the next Analyze click retries.
+    return analyze_food(_image, raise_on_error=True)
+
+
+# --- Helper: memoize derived data per session until the log changes ---
+def _session_memo(name: str, version, build):
+    cached = st.session_state.get(name)
+    if cached is None or cached[0] != version:
+        cached = (version, build())
+        st.session_state[name] = cached
+    return cached[1]
+
+
+# --- Helper: append a meal to the log and its columns ---
+def add_log_entry(entry: dict):
+    _save_log_entry(USER_ID, entry)
+    st.session_state["log_entries"].append(entry)
+    cols = st.session_state["log_cols"]
+    cols["date"] = np.append(cols["date"], np.array([entry["date"]], dtype=cols["date"].dtype))
+    cols["macros"] = np.vstack([cols["macros"], [[entry[k] for k in LOG_NUMERIC]]])
+
+
+# --- Helper: totals for one day from the columnar log ---
+def day_totals(day_str: str):
+    """Return (meals, calories, protein, carbs, fat) logged on `day_str`."""
+    cols = st.session_state["log_cols"]
+    mask = cols["date"] == day_str
+    calories, protein, carbs, fat, _ = cols["macros"][mask].sum(axis=0).tolist()
+    return int(mask.sum()), int(round(calories)), protein, carbs, fat
+
+
+# --- Helper: history table (without images) for display and CSV export ---
+HISTORY_FIELDS = (
+    "date", "time", "foods", "calories", "protein",
+    "carbs", "fat", "fiber", "portion", "goal",
+)
+
+
+def _build_history_frame():
+    import pandas as pd
+
+    return pd.DataFrame([
+        {k: (", ".join(e[k]) if k == "foods" else e[k]) for k in HISTORY_FIELDS}
+        for e in st.session_state["log_entries"]
+    ])
+
 
 # --- Helper: get today's entries ---
 def get_today_entries():
-    today_str = date.today().isoformat()
-    return [e for e in st.session_state["log_entries"] if e["date"] == today_str]
+    return [e for e in st.session_state["log_entries"] if e["date"] == TODAY_STR]
 
 
 # --- Helper: simple smart coach message based on today's log ---
 def generate_coach_message(goal: str):
-    entries = get_today_entries()
-    if not entries:
+    meals_count, total_cals, total_protein, total_carbs, total_fat = day_totals(TODAY_STR)
+    if not meals_count:
         return (
             "You haven't logged any meals today yet. "
             "Scan and log your meals to get personalized coaching."
         )
 
-    total_cals = sum(e["calories"] for e in entries)
-    total_protein = sum(e["protein"] for e in entries)
-    total_carbs = sum(e["carbs"] for e in entries)
-    total_fat = sum(e["fat"] for e in entries)
-    meals_count = len(entries)
-
-    # Rough target ranges (very simplified)
-    if goal == "lose":
-        target_min, target_max = 1400, 1900
-    elif goal == "gain":
-        target_min, target_max = 2200, 2800
-    else:
-        target_min, target_max = 1800, 2300
-
-    lines = []
-
-    lines.append(f"📊 You logged **{meals_count}** meal(s) today with about **{total_cals} kcal** in total.")
-    lines.append(
-        f"Approx macros: **Protein** {total_protein:.0f} g, "
-        f"**Carbs** {total_carbs:.0f} g, **Fat** {total_fat:.0f} g."
-    )
-
-    # Calorie analysis
-    if total_cals < target_min:
-        if goal == "lose":
-            lines.append(
-                "You're **below** the typical calorie range for weight loss. "
-                "Make sure you're not undereating; add some nutrient-dense foods like dal, paneer, eggs, nuts."
-            )
-        elif goal == "gain":
-            lines.append(
-                "You're well **below** the calorie range needed for weight gain. "
-                "Add at least one more solid meal or calorie-dense snacks."
-            )
-        else:
-            lines.append(
-                "You're **under** a typical maintenance range. "
-                "If you feel low on energy, consider adding an extra balanced meal."
-            )
-    elif total_cals > target_max:
-        if goal == "lose":
-            lines.append(
-                "You're **above** the usual calorie range for weight loss today. "
-                "Balance it tomorrow with lighter meals and more activity."
-            )
-        elif goal == "gain":
-            lines.append(
-                "You're on the **higher** side of calories, which can support weight gain, "
-                "but ensure they come from quality foods, not just junk."
-            )
-        else:
-            lines.append(
-                "You're **above** a typical maintenance range. "
-                "If days like this are frequent, it may slowly lead to weight gain."
-            )
-    else:
-        if goal == "lose":
-            lines.append(
-                "Nice! Your total calories are within a reasonable range for weight loss today. "
-                "Keep focusing on protein and fiber to stay full."
-            )
-        elif goal == "gain":
-            lines.append(
-                "Good! Your total calories are in a decent range for weight gain. "
-                "Combine this with strength training to gain mostly muscle."
-            )
-        else:
-            lines.append(
-                "You're roughly in a **maintenance** range today. "
-                "If your weight stays stable over weeks, this is likely your sweet spot."
-            )
-
-    # Protein analysis
-    if total_protein < 50:
-        lines.append(
-            "Protein intake looks on the **lower side**. Try to include more dal, paneer, chana, rajma, eggs or lean meat."
-        )
-    elif total_protein > 120:
-        lines.append(
-            "Protein intake is **quite high**, which is okay if you train regularly, but keep hydration up and balance with veggies."
-        )
-    else:
-        lines.append(
-            "Protein intake looks **okay** for a typical day. Good job including some protein sources."
-        )
-
-    # Carbs & fat brief check
-    if total_carbs > total_fat * 4:
-        lines.append(
-            "Your day leaned more towards **carb-heavy** meals. Try adding some healthy fats (nuts, seeds, ghee in moderation) and protein."
-        )
-    elif total_fat > total_carbs:
-        lines.append(
-            "Your day is a bit **fat-heavy**. Reduce deep-fried and creamy foods and replace them with grilled/steamed options."
-        )
+    return coach_message(goal, meals_count, total_cals, total_protein, total_carbs, total_fat)
 
-    # Behaviour advice
-    lines.append(
-        "💡 Tip: Try to spread your calories across the day (breakfast, lunch, dinner, 1–2 snacks) "
-        "instead of having one very heavy meal."
-    )
 
-    return "\n\n".join(lines)
+# --- Custom CSS (read from disk once per process) ---
+@st.cache_data(show_spinner=False)
+def _css():
+    with open(os.path.join(os.path.dirname(__file__), "assets", "style.css"), encoding="utf-8") as f:
+        return f.read()
 
 
-# --- Custom CSS ---
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 3rem;
-        color: #FF6B6B;
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-    .sub-header {
-        font-size: 1.2rem;
-        color: #4ECDC4;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .food-name {
-        font-size: 2rem;
-        color: #2ECC71;
-        font-weight: bold;
-    }
-    .confidence-score {
-        font-size: 1.1rem;
-        color: #3498DB;
-    }
-    .nutrition-box {
-        background-color: #f0f2f6;
-        padding: 1.5rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-    }
-    .recommendation {
-        background-color: #E8F8F5;
-        padding: 1rem;
-        border-left: 4px solid #1ABC9C;
-        margin: 0.5rem 0;
-        border-radius: 5px;
-        font-size: 0.95rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(f"<style>{_css()}</style>", unsafe_allow_html=True)
 
 # --- Header ---
 st.markdown('<h1 class="main-header">🍽️ ScanEat</h1>', unsafe_allow_html=True)
@@ -242,24 +338,271 @@ goal_map = {
 selected_goal = goal_map[goal_label]
 
 # Sidebar: today's summary
-today_str = date.today().isoformat()
-today_entries = get_today_entries()
-today_cals = sum(e["calories"] for e in today_entries) if today_entries else 0
+today_meals, today_cals = day_totals(TODAY_STR)[:2]
 
 st.sidebar.markdown("---")
 st.sidebar.subheader("📅 Today's Summary")
 
-if today_entries:
-    st.sidebar.write(f"Meals logged: **{len(today_entries)}**")
+if today_meals:
+    st.sidebar.write(f"Meals logged: **{today_meals}**")
     st.sidebar.write(f"Total calories: **{today_cals} kcal**")
     st.sidebar.write("Recent meals:")
-    for e in today_entries[-5:][::-1]:
-        st.sidebar.write(f"- {e['time']} · {', '.join([f.title() for f in e['foods']])} · {e['calories']} kcal")
+    # Walk the log newest-first and stop after 5, instead of filtering the whole log
+    recent = islice(
+        (e for e in reversed(st.session_state["log_entries"]) if e["date"] == TODAY_STR),
+        5,
+    )
+    for e in recent:
+        st.sidebar.write(f"- {e['time']} · {', '.join(e['foods_display'])} · {e['calories']} kcal")
 else:
     st.sidebar.write("No meals logged yet today.")
 
+
+# Analysis UI runs as a fragment: the plate multiselect, portion slider and
+# log button rerun only this block, not the sidebar or the rest of the page.
+@st.fragment
+def _analysis_fragment(image, image_key: str, goal: str):
+    det_key = f"det_{image_key}"
+    if st.button("🔍 Analyze Food", type="primary", use_container_width=True):
+        with st.spinner("Looking at your image..."):
+            try:
+                analysis_image = _prep(image, 512)
+                st.session_state[det_key] = _cached_detect(image_key, analysis_image)
+            except Exception as e:
+                st.error(f"❌ Error processing image: {e}")
+
+    # Detection is kept per image so plate/portion tweaks don't re-run it
+    if det_key in st.session_state:
+        try:
+            is_food, food_name, confidence, alternatives = st.session_state[det_key]
+
+            # 1) Check if this looks like a food photo
+            if not is_food or confidence < 0.4:
+                st.warning(
+                    "📷 This looks like a **generic image or unclear food**. "
+                    "I'll still try to guess what it is."
+                )
+            else:
+                st.success(
+                    f"✅ This looks like a **food image** "
+                    f"(model confidence ~{confidence*100:.1f}%)."
+                )
+
+            # 2) Recognize what the image looks like
+
+            if food_name == "unknown" or confidence < 0.3:
+                st.error(
+                    "🤔 I couldn't confidently recognize a specific food item in this image.\n"
+                    "It might not be food, or the photo is too unclear.\n\n"
+                    "Try a clearer, closer top-view photo of the food on your plate."
+                )
+            else:
+                st.markdown(
+                    f'<p class="food-name">🖼️ I see: {food_name.title()}</p>',
+                    unsafe_allow_html=True
+                )
+                st.markdown(
+                    f'<p class="confidence-score">Model confidence: {confidence*100:.1f}%</p>',
+                    unsafe_allow_html=True
+                )
+
+                if alternatives:
+                    st.info(
+                        f"💡 Similar things the AI also sees here: {', '.join(alternatives[:4])}"
+                    )
+
+                # --- Multi-food plate selection ---
+                st.markdown("### 🍽 What's on your plate?")
+
+                # Candidate list: main food + alternatives
+                candidate_items = [food_name] + [
+                    alt for alt in alternatives if isinstance(alt, str)
+                ]
+
+                selected_items = st.multiselect(
+                    "Select all foods you actually see in this image:",
+                    options=candidate_items,
+                    default=[food_name],
+                    help="If the plate has multiple items (e.g., rice + curry + salad), select them all."
+                )
+
+                # Portion size slider
+                portion = st.slider(
+                    "How much of this plate did you (or will you) eat?",
+                    min_value=0.25,
+                    max_value=2.0,
+                    value=1.0,
+                    step=0.25,
+                    help="0.5 = half plate, 1.0 = full plate, 2.0 = double serving."
+                )
+
+                combined_nutrition = None
+
+                if selected_items:
+                    items = tuple(sorted(selected_items))
+                    by_item = dict(zip(items, _bulk_nutrition(items)))
+                    missing_items = [item for item in selected_items if not by_item[item]]
+                    found = [n for n in by_item.values() if n]
+
+                    # One vectorized reduction over (items x nutrients), then portion factor
+                    totals = np.zeros(len(PLATE_NUTRIENTS))
+                    if found:
+                        totals = np.array(
+                            [[n.get(k, 0.0) for k in PLATE_NUTRIENTS] for n in found],
+                            dtype=np.float64,
+                        ).sum(axis=0) * portion
+                    combined_nutrition = dict(zip(PLATE_NUTRIENTS, totals.tolist()))
+
+                    if combined_nutrition["calories"] > 0:
+                        st.markdown("#### 🧮 Estimated plate totals (based on selected items & portion)")
+                        st.markdown('<div class="nutrition-box">', unsafe_allow_html=True)
+
+                        macros = st.columns(4)
+                        macros[0].metric("🔥 Calories", f"{combined_nutrition['calories']:.0f} kcal")
+                        macros[1].metric("💪 Protein", f"{combined_nutrition['protein']:.1f} g")
+                        macros[2].metric("🍞 Carbs", f"{combined_nutrition['carbs']:.1f} g")
+                        macros[3].metric("🥑 Fat", f"{combined_nutrition['fat']:.1f} g")
+
+                        st.markdown(f"**Fiber:** {combined_nutrition['fiber']:.1f} g")
+
+                        st.markdown("</div>", unsafe_allow_html=True)
+
+                        if missing_items:
+                            st.warning(
+                                "No nutrition data found for: "
+                                + ", ".join(missing_items)
+                                + ". You can extend the database later."
+                            )
+                    else:
+                        st.info(
+                            "I couldn't find nutrition data for the selected items. "
+                            "Try selecting a simpler item like 'pizza', 'rice', 'roti', etc."
+                        )
+
+                # --- Main item nutrition + recs ---
+                main_nutrition = _cached_nutrition(food_name)
+
+                if main_nutrition:
+                    st.markdown("### 📋 Nutrition for main item (1 serving)")
+                    st.markdown('<div class="nutrition-box">', unsafe_allow_html=True)
+
+                    macros = st.columns(4)
+                    macros[0].metric("🔥 Calories", f"{main_nutrition['calories']} kcal")
+                    macros[1].metric("💪 Protein", f"{main_nutrition['protein']} g")
+                    macros[2].metric("🍞 Carbs", f"{main_nutrition['carbs']} g")
+                    macros[3].metric("🥑 Fat", f"{main_nutrition['fat']} g")
+
+                    st.markdown(f"**Fiber:** {main_nutrition.get('fiber', 0)} g")
+
+                    if main_nutrition.get("vitamins"):
+                        st.markdown("**Top Vitamins:**")
+                        vitamin_text = " | ".join(
+                            [f"{k}: {v}" for k, v in list(main_nutrition["vitamins"].items())[:3]]
+                        )
+                        st.text(vitamin_text)
+
+                    if main_nutrition.get("minerals"):
+                        st.markdown("**Top Minerals:**")
+                        mineral_text = " | ".join(
+                            [f"{k}: {v}" for k, v in list(main_nutrition["minerals"].items())[:3]]
+                        )
+                        st.text(mineral_text)
+
+                    st.markdown("</div>", unsafe_allow_html=True)
+
+                    # Recommendations for main item
+                    st.markdown("### 💡 Personalized Recommendations (main item)")
+                    recs = _cached_recs(
+                        food_name.lower().strip(), goal, _nutrition_sig(main_nutrition)
+                    )
+                    for rec in recs:
+                        st.markdown(
+                            f'<div class="recommendation">{rec}</div>',
+                            unsafe_allow_html=True
+                        )
+
+                    # Alternatives for main item
+                    st.markdown("### 🥗 Healthier Alternatives (main item)")
+                    alt_list = _cached_alternatives(food_name.lower().strip())
+                    for alt in alt_list:
+                        st.markdown(f"- {alt}")
+
+                    # Weight impact (use combined if available, else main item calories)
+                    st.markdown("### ⚖️ Weight Impact")
+                    if combined_nutrition and combined_nutrition["calories"] > 0:
+                        used_cals = combined_nutrition["calories"]
+                        used_protein = combined_nutrition["protein"]
+                        used_carbs = combined_nutrition["carbs"]
+                        used_fat = combined_nutrition["fat"]
+                        used_fiber = combined_nutrition["fiber"]
+                    else:
+                        used_cals = main_nutrition["calories"] * portion
+                        used_protein = main_nutrition["protein"] * portion
+                        used_carbs = main_nutrition["carbs"] * portion
+                        used_fat = main_nutrition["fat"] * portion
+                        used_fiber = main_nutrition.get("fiber", 0.0) * portion
+
+                    if goal == "lose":
+                        info = (
+                            f"This plate (with portion factor {portion}x) is about **{used_cals:.0f} kcal**. "
+                            "For weight loss, stay in a daily calorie deficit and "
+                            "balance this with lighter meals and activity."
+                        )
+                    elif goal == "gain":
+                        info = (
+                            f"This plate (with portion factor {portion}x) is about **{used_cals:.0f} kcal**. "
+                            "For healthy weight gain, combine it with enough protein and strength training."
+                        )
+                    else:
+                        info = (
+                            f"This plate (with portion factor {portion}x) is about **{used_cals:.0f} kcal** "
+                            "and can fit into a balanced diet if it matches your total daily calorie needs."
+                        )
+                    st.info(info)
+
+                    # --- Add to daily log ---
+                    if st.button("➕ Add this meal to today's log"):
+                        now = datetime.now()
+                        foods = selected_items if selected_items else [food_name]
+                        raw = np.array(
+                            [used_cals, used_protein, used_carbs, used_fat, used_fiber, portion],
+                            dtype=np.float64,
+                        )
+                        protein, carbs, fat, fiber, portion_f = raw[1:].round(1).tolist()
+                        entry = {
+                            "date": TODAY_STR,
+                            "time": now.strftime("%H:%M"),
+                            "foods": [f.lower() for f in foods],
+                            "foods_display": [f.title() for f in foods],
+                            "calories": int(raw[0].round()),
+                            "protein": protein,
+                            "carbs": carbs,
+                            "fat": fat,
+                            "fiber": fiber,
+                            "portion": portion_f,
+                            "goal": goal,
+                            "image_bytes": _thumbnail_jpeg(image),
+                        }
+                        add_log_entry(entry)
+                        # Full rerun so the sidebar's Today's Summary picks up the meal
+                        st.session_state["meal_logged"] = True
+                        st.rerun(scope="app")
+                    if st.session_state.pop("meal_logged", False):
+                        st.success("✅ Added to today's log!")
+                else:
+                    st.warning(
+                        "I recognized this as a food item but don't have nutrition data for it yet.\n"
+                        "You can extend the local nutrition database or connect more APIs later."
+                    )
+
+        except Exception as e:
+            st.error(f"❌ Error processing image: {e}")
+
+
 # ---------------------- PAGE 1: SCAN FOOD ----------------------
-if page == "Scan Food":
+def _page_scan(goal: str):
+    from PIL import Image
+
     col1, col2 = st.columns([1, 1])
 
     with col1:
@@ -272,6 +615,7 @@ if page == "Scan Food":
         )
 
         image = None
+        image_key = None
 
         if input_method == "📤 Upload Image":
             uploaded_file = st.file_uploader(
@@ -280,11 +624,13 @@ if page == "Scan Food":
             )
             if uploaded_file is not None:
                 image = Image.open(uploaded_file)
+                image_key = hashlib.sha1(uploaded_file.getvalue()).hexdigest()
                 st.image(image, caption="Your Image", use_column_width=True)
         else:
             camera_photo = st.camera_input("Take a picture")
             if camera_photo is not None:
                 image = Image.open(camera_photo)
+                image_key = hashlib.sha1(camera_photo.getvalue()).hexdigest()
                 st.image(image, caption="Your Image", use_column_width=True)
 
         st.markdown("""
@@ -296,247 +642,18 @@ You're about to eat something → open ScanEat → take a quick photo → hit *A
         st.subheader("📊 AI Understanding & Nutrition")
 
         if image is not None:
-            if st.button("🔍 Analyze Food", type="primary", use_container_width=True):
-                with st.spinner("Looking at your image..."):
-                    try:
-                        # 1) Check if this looks like a food photo
-                        is_food, validation_confidence = validate_food_image(image)
-
-                        if not is_food or validation_confidence < 0.4:
-                            st.warning(
-                                "📷 This looks like a **generic image or unclear food**. "
-                                "I'll still try to guess what it is."
-                            )
-                        else:
-                            st.success(
-                                f"✅ This looks like a **food image** "
-                                f"(model confidence ~{validation_confidence*100:.1f}%)."
-                            )
-
-                        # 2) Recognize what the image looks like
-                        detection = recognize_food_advanced(image)
-                        food_name = detection["name"]
-                        confidence = detection["confidence"]
-                        alternatives = detection.get("alternatives", [])
-
-                        if food_name == "unknown" or confidence < 0.3:
-                            st.error(
-                                "🤔 I couldn't confidently recognize a specific food item in this image.\n"
-                                "It might not be food, or the photo is too unclear.\n\n"
-                                "Try a clearer, closer top-view photo of the food on your plate."
-                            )
-                        else:
-                            st.markdown(
-                                f'<p class="food-name">🖼️ I see: {food_name.title()}</p>',
-                                unsafe_allow_html=True
-                            )
-                            st.markdown(
-                                f'<p class="confidence-score">Model confidence: {confidence*100:.1f}%</p>',
-                                unsafe_allow_html=True
-                            )
-
-                            if alternatives:
-                                st.info(
-                                    f"💡 Similar things the AI also sees here: {', '.join(alternatives[:4])}"
-                                )
-
-                            # --- Multi-food plate selection ---
-                            st.markdown("### 🍽 What's on your plate?")
-
-                            # Candidate list: main food + alternatives
-                            candidate_items = [food_name] + [
-                                alt for alt in alternatives if isinstance(alt, str)
-                            ]
-
-                            selected_items = st.multiselect(
-                                "Select all foods you actually see in this image:",
-                                options=candidate_items,
-                                default=[food_name],
-                                help="If the plate has multiple items (e.g., rice + curry + salad), select them all."
-                            )
-
-                            # Portion size slider
-                            portion = st.slider(
-                                "How much of this plate did you (or will you) eat?",
-                                min_value=0.25,
-                                max_value=2.0,
-                                value=1.0,
-                                step=0.25,
-                                help="0.5 = half plate, 1.0 = full plate, 2.0 = double serving."
-                            )
-
-                            combined_nutrition = None
-
-                            if selected_items:
-                                combined_nutrition = {
-                                    "calories": 0,
-                                    "protein": 0.0,
-                                    "carbs": 0.0,
-                                    "fat": 0.0,
-                                    "fiber": 0.0,
-                                }
-                                missing_items = []
-
-                                for item in selected_items:
-                                    n = get_nutrition_info(item)
-                                    if not n:
-                                        missing_items.append(item)
-                                        continue
-                                    combined_nutrition["calories"] += n["calories"]
-                                    combined_nutrition["protein"] += n["protein"]
-                                    combined_nutrition["carbs"] += n["carbs"]
-                                    combined_nutrition["fat"] += n["fat"]
-                                    combined_nutrition["fiber"] += n.get("fiber", 0.0)
-
-                                # Apply portion factor
-                                for k in combined_nutrition:
-                                    combined_nutrition[k] *= portion
-
-                                if combined_nutrition["calories"] > 0:
-                                    st.markdown("#### 🧮 Estimated plate totals (based on selected items & portion)")
-                                    st.markdown('<div class="nutrition-box">', unsafe_allow_html=True)
-
-                                    macros = st.columns(4)
-                                    macros[0].metric("🔥 Calories", f"{combined_nutrition['calories']:.0f} kcal")
-                                    macros[1].metric("💪 Protein", f"{combined_nutrition['protein']:.1f} g")
-                                    macros[2].metric("🍞 Carbs", f"{combined_nutrition['carbs']:.1f} g")
-                                    macros[3].metric("🥑 Fat", f"{combined_nutrition['fat']:.1f} g")
-
-                                    st.markdown(f"**Fiber:** {combined_nutrition['fiber']:.1f} g")
-
-                                    st.markdown("</div>", unsafe_allow_html=True)
-
-                                    if missing_items:
-                                        st.warning(
-                                            "No nutrition data found for: "
-                                            + ", ".join(missing_items)
-                                            + ". You can extend the database later."
-                                        )
-                                else:
-                                    st.info(
-                                        "I couldn't find nutrition data for the selected items. "
-                                        "Try selecting a simpler item like 'pizza', 'rice', 'roti', etc."
-                                    )
-
-                            # --- Main item nutrition + recs ---
-                            main_nutrition = get_nutrition_info(food_name)
-
-                            if main_nutrition:
-                                st.markdown("### 📋 Nutrition for main item (1 serving)")
-                                st.markdown('<div class="nutrition-box">', unsafe_allow_html=True)
-
-                                macros = st.columns(4)
-                                macros[0].metric("🔥 Calories", f"{main_nutrition['calories']} kcal")
-                                macros[1].metric("💪 Protein", f"{main_nutrition['protein']} g")
-                                macros[2].metric("🍞 Carbs", f"{main_nutrition['carbs']} g")
-                                macros[3].metric("🥑 Fat", f"{main_nutrition['fat']} g")
-
-                                st.markdown(f"**Fiber:** {main_nutrition.get('fiber', 0)} g")
-
-                                if main_nutrition.get("vitamins"):
-                                    st.markdown("**Top Vitamins:**")
-                                    vitamin_text = " | ".join(
-                                        [f"{k}: {v}" for k, v in list(main_nutrition["vitamins"].items())[:3]]
-                                    )
-                                    st.text(vitamin_text)
-
-                                if main_nutrition.get("minerals"):
-                                    st.markdown("**Top Minerals:**")
-                                    mineral_text = " | ".join(
-                                        [f"{k}: {v}" for k, v in list(main_nutrition["minerals"].items())[:3]]
-                                    )
-                                    st.text(mineral_text)
-
-                                st.markdown("</div>", unsafe_allow_html=True)
-
-                                # Recommendations for main item
-                                st.markdown("### 💡 Personalized Recommendations (main item)")
-                                recs = get_meal_recommendations(food_name, main_nutrition, selected_goal)
-                                for rec in recs:
-                                    st.markdown(
-                                        f'<div class="recommendation">{rec}</div>',
-                                        unsafe_allow_html=True
-                                    )
-
-                                # Alternatives for main item
-                                st.markdown("### 🥗 Healthier Alternatives (main item)")
-                                alt_list = get_healthier_alternatives(food_name)
-                                for alt in alt_list:
-                                    st.markdown(f"- {alt}")
-
-                                # Weight impact (use combined if available, else main item calories)
-                                st.markdown("### ⚖️ Weight Impact")
-                                if combined_nutrition and combined_nutrition["calories"] > 0:
-                                    used_cals = combined_nutrition["calories"]
-                                    used_protein = combined_nutrition["protein"]
-                                    used_carbs = combined_nutrition["carbs"]
-                                    used_fat = combined_nutrition["fat"]
-                                    used_fiber = combined_nutrition["fiber"]
-                                else:
-                                    used_cals = main_nutrition["calories"] * portion
-                                    used_protein = main_nutrition["protein"] * portion
-                                    used_carbs = main_nutrition["carbs"] * portion
-                                    used_fat = main_nutrition["fat"] * portion
-                                    used_fiber = main_nutrition.get("fiber", 0.0) * portion
-
-                                if selected_goal == "lose":
-                                    info = (
-                                        f"This plate (with portion factor {portion}x) is about **{used_cals:.0f} kcal**. "
-                                        "For weight loss, stay in a daily calorie deficit and "
-                                        "balance this with lighter meals and activity."
-                                    )
-                                elif selected_goal == "gain":
-                                    info = (
-                                        f"This plate (with portion factor {portion}x) is about **{used_cals:.0f} kcal**. "
-                                        "For healthy weight gain, combine it with enough protein and strength training."
-                                    )
-                                else:
-                                    info = (
-                                        f"This plate (with portion factor {portion}x) is about **{used_cals:.0f} kcal** "
-                                        "and can fit into a balanced diet if it matches your total daily calorie needs."
-                                    )
-                                st.info(info)
-
-                                # --- Add to daily log ---
-                                if st.button("➕ Add this meal to today's log"):
-                                    now = datetime.now()
-                                    entry = {
-                                        "date": today_str,
-                                        "time": now.strftime("%H:%M"),
-                                        "foods": selected_items if selected_items else [food_name],
-                                        "calories": int(round(used_cals)),
-                                        "protein": float(round(used_protein, 1)),
-                                        "carbs": float(round(used_carbs, 1)),
-                                        "fat": float(round(used_fat, 1)),
-                                        "fiber": float(round(used_fiber, 1)),
-                                        "portion": float(portion),
-                                        "goal": selected_goal,
-                                        "image": image.copy(),
-                                    }
-                                    st.session_state["log_entries"].append(entry)
-                                    st.success("✅ Added to today's log!")
-                            else:
-                                st.warning(
-                                    "I recognized this as a food item but don't have nutrition data for it yet.\n"
-                                    "You can extend the local nutrition database or connect more APIs later."
-                                )
-
-                    except Exception as e:
-                        st.error(f"❌ Error processing image: {e}")
-
+            _analysis_fragment(image, image_key, goal)
         else:
             st.info("👆 Please upload or capture an image to begin analysis.")
 
+
 # ---------------------- PAGE 2: TODAY'S LOG & HISTORY ----------------------
-elif page == "Today's Log & History":
+def _page_log(goal: str):
     st.subheader("📅 Today's Log")
 
     today_entries = get_today_entries()
     if today_entries:
-        total_cals = sum(e["calories"] for e in today_entries)
-        total_protein = sum(e["protein"] for e in today_entries)
-        total_carbs = sum(e["carbs"] for e in today_entries)
-        total_fat = sum(e["fat"] for e in today_entries)
+        _, total_cals, total_protein, total_carbs, total_fat = day_totals(TODAY_STR)
 
         st.write(f"**Total meals today:** {len(today_entries)}")
         st.write(f"**Total calories:** {total_cals} kcal")
@@ -548,13 +665,13 @@ elif page == "Today's Log & History":
 
         st.markdown("### 🧾 Detailed meals")
         for e in today_entries[::-1]:
-            with st.expander(f"{e['time']} · {', '.join([f.title() for f in e['foods']])} · {e['calories']} kcal"):
+            with st.expander(f"{e['time']} · {', '.join(e['foods_display'])} · {e['calories']} kcal"):
                 cols = st.columns([1, 2])
                 with cols[0]:
-                    if e.get("image") is not None:
-                        st.image(e["image"], caption="Meal image", use_column_width=True)
+                    if e.get("image_bytes"):
+                        st.image(e["image_bytes"], caption="Meal image", use_column_width=True)
                 with cols[1]:
-                    st.write(f"**Foods:** {', '.join([f.title() for f in e['foods']])}")
+                    st.write(f"**Foods:** {', '.join(e['foods_display'])}")
                     st.write(f"**Calories:** {e['calories']} kcal")
                     st.write(
                         f"**Protein:** {e['protein']} g · "
@@ -569,31 +686,19 @@ elif page == "Today's Log & History":
         st.info("No meals logged today yet. Go to **Scan Food** and add one.")
 
     st.markdown("---")
-    st.subheader("📚 Full Session History (All Days in this Session)")
+    st.subheader("📚 Full History (All Days)")
 
     if st.session_state["log_entries"]:
-        # For table + export, drop the image field
-        table_data = []
-        for e in st.session_state["log_entries"]:
-            row = {
-                "date": e["date"],
-                "time": e["time"],
-                "foods": ", ".join(e["foods"]),
-                "calories": e["calories"],
-                "protein": e["protein"],
-                "carbs": e["carbs"],
-                "fat": e["fat"],
-                "fiber": e["fiber"],
-                "portion": e["portion"],
-                "goal": e["goal"],
-            }
-            table_data.append(row)
-
-        df = pd.DataFrame(table_data)
+        # For table + export, drop the image field. The log is append-only,
+        # so both the frame and the CSV bytes are rebuilt only on new entries.
+        n_logs = len(st.session_state["log_entries"])
+        df = _session_memo("history_df", n_logs, _build_history_frame)
         st.dataframe(df, use_container_width=True)
 
         # Export as CSV
-        csv_bytes = df.to_csv(index=False).encode("utf-8")
+        csv_bytes = _session_memo(
+            "history_csv", n_logs, lambda: df.to_csv(index=False).encode("utf-8")
+        )
         st.download_button(
             label="⬇️ Download full log as CSV",
             data=csv_bytes,
@@ -601,11 +706,14 @@ elif page == "Today's Log & History":
             mime="text/csv",
         )
     else:
-        st.info("No history in this session yet.")
+        st.info("No history yet.")
+
 
 # ---------------------- PAGE 3: WEEKLY SUMMARY ----------------------
-elif page == "Weekly Summary":
-    st.subheader("📈 Weekly Summary (based on current session logs)")
+def _page_week(goal: str):
+    import pandas as pd
+
+    st.subheader("📈 Weekly Summary (based on your logs)")
 
     logs = st.session_state["log_entries"]
     if not logs:
@@ -615,59 +723,49 @@ elif page == "Weekly Summary":
         )
     else:
         # Last 7 days including today
-        today_dt = date.today()
-        start_dt = today_dt - timedelta(days=6)
+        dates_list = [(TODAY - timedelta(days=6 - i)).isoformat() for i in range(7)]
 
-        filtered = [
-            e for e in logs
-            if start_dt <= datetime.fromisoformat(e["date"]).date() <= today_dt
-        ]
+        # The log is append-only, so its length identifies the frame
+        log_df = _session_memo(
+            "weekly_df",
+            len(logs),
+            lambda: pd.DataFrame(logs, columns=["date", "calories", "foods"]),
+        )
+        week_df = log_df[log_df["date"].between(WEEK_START_STR, TODAY_STR)]
 
-        if not filtered:
+        if week_df.empty:
             st.info("No entries in the last 7 days.")
         else:
-            # Aggregate calories per day
-            day_map = {}
-            for e in filtered:
-                d = e["date"]
-                day_map.setdefault(d, 0)
-                day_map[d] += e["calories"]
-
-            # Ensure all 7 days appear
-            dates_list = [(start_dt + timedelta(days=i)).isoformat() for i in range(7)]
-            cals_list = [day_map.get(d, 0) for d in dates_list]
-
-            df = pd.DataFrame({
-                "date": dates_list,
-                "calories": cals_list,
-            })
+            # Aggregate calories per day, making sure all 7 days appear
+            cal_by_day = (
+                week_df.groupby("date")["calories"].sum()
+                .reindex(dates_list, fill_value=0)
+            )
 
             st.write("**Calories per day (last 7 days):**")
-            st.bar_chart(df.set_index("date"))
+            st.bar_chart(cal_by_day)
 
-            total_week_cals = sum(cals_list)
+            total_week_cals = cal_by_day.sum()
             avg_daily_cals = total_week_cals / 7.0
 
             st.write(f"**Total calories in last 7 days:** {total_week_cals:.0f} kcal")
             st.write(f"**Average calories per day:** {avg_daily_cals:.0f} kcal")
 
             # Top foods this week
-            food_counts = {}
-            for e in filtered:
-                for f in e["foods"]:
-                    food_counts[f] = food_counts.get(f, 0) + 1
+            # Partial selection of the top 5 rather than a full sort of all foods
+            top_foods = week_df["foods"].explode().value_counts(sort=False).nlargest(5)
 
-            if food_counts:
-                top_foods = sorted(food_counts.items(), key=lambda x: x[1], reverse=True)
+            if not top_foods.empty:
                 st.markdown("### 🍛 Most frequently eaten foods this week")
-                for name, count in top_foods[:5]:
+                for name, count in top_foods.items():
                     st.write(f"- {name.title()} · {count} time(s)")
 
+
 # ---------------------- PAGE 4: SMART COACH ----------------------
-elif page == "Smart Coach":
+def _page_coach(goal: str):
     st.subheader("🧠 Smart Coach")
 
-    message = generate_coach_message(selected_goal)
+    message = generate_coach_message(goal)
     st.markdown(message)
     st.markdown("---")
     st.info(
@@ -675,6 +773,16 @@ elif page == "Smart Coach":
         "It's not a medical or dietician-grade plan, but a helpful guide."
     )
 
+
+# --- Page dispatch ---
+PAGES = {
+    "Scan Food": _page_scan,
+    "Today's Log & History": _page_log,
+    "Weekly Summary": _page_week,
+    "Smart Coach": _page_coach,
+}
+PAGES[page](selected_goal)
+
 # --- Footer ---
 st.markdown("---")
 st.markdown("""
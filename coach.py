@@ -0,0 +1,130 @@
+# coach.py
+"""
+Smart Coach rules and messages. They live in an imported module rather than
+app.py because Streamlit re-executes app.py on every rerun; here the numba
+dispatcher and the message cache are built once per process.
+"""
+
+import functools
+
+from kernels import GOAL_CODES, njit
+
+
+@njit(cache=True)
+def classify_day(total_cals, total_protein, total_carbs, total_fat, goal_code):
+    """
+    Return (cal_bucket, protein_bucket, ratio_flag):
+      cal_bucket:     0 below, 1 within, 2 above the goal's target range
+      protein_bucket: 0 low, 1 okay, 2 high
+      ratio_flag:     0 balanced, 1 carb-heavy, 2 fat-heavy
+    """
+    # Rough target ranges (very simplified)
+    if goal_code == 0:
+        target_min, target_max = 1400, 1900
+    elif goal_code == 2:
+        target_min, target_max = 2200, 2800
+    else:
+        target_min, target_max = 1800, 2300
+
+    if total_cals < target_min:
+        cal_bucket = 0
+    elif total_cals > target_max:
+        cal_bucket = 2
+    else:
+        cal_bucket = 1
+
+    if total_protein < 50:
+        protein_bucket = 0
+    elif total_protein > 120:
+        protein_bucket = 2
+    else:
+        protein_bucket = 1
+
+    if total_carbs > total_fat * 4:
+        ratio_flag = 1
+    elif total_fat > total_carbs:
+        ratio_flag = 2
+    else:
+        ratio_flag = 0
+
+    return cal_bucket, protein_bucket, ratio_flag
+
+
+# Calorie advice per goal, indexed by cal_bucket (below, within, above)
+COACH_CALORIE_ADVICE = {
+    "lose": (
+        "You're **below** the typical calorie range for weight loss. "
+        "Make sure you're not undereating; add some nutrient-dense foods like dal, paneer, eggs, nuts.",
+        "Nice! Your total calories are within a reasonable range for weight loss today. "
+        "Keep focusing on protein and fiber to stay full.",
+        "You're **above** the usual calorie range for weight loss today. "
+        "Balance it tomorrow with lighter meals and more activity.",
+    ),
+    "gain": (
+        "You're well **below** the calorie range needed for weight gain. "
+        "Add at least one more solid meal or calorie-dense snacks.",
+        "Good! Your total calories are in a decent range for weight gain. "
+        "Combine this with strength training to gain mostly muscle.",
+        "You're on the **higher** side of calories, which can support weight gain, "
+        "but ensure they come from quality foods, not just junk.",
+    ),
+    "maintain": (
+        "You're **under** a typical maintenance range. "
+        "If you feel low on energy, consider adding an extra balanced meal.",
+        "You're roughly in a **maintenance** range today. "
+        "If your weight stays stable over weeks, this is likely your sweet spot.",
+        "You're **above** a typical maintenance range. "
+        "If days like this are frequent, it may slowly lead to weight gain.",
+    ),
+}
+
+# Protein advice, indexed by protein_bucket (low, okay, high)
+COACH_PROTEIN_ADVICE = (
+    "Protein intake looks on the **lower side**. Try to include more dal, paneer, chana, rajma, eggs or lean meat.",
+    "Protein intake looks **okay** for a typical day. Good job including some protein sources.",
+    "Protein intake is **quite high**, which is okay if you train regularly, but keep hydration up and balance with veggies.",
+)
+
+# Carbs & fat advice, indexed by ratio_flag (balanced, carb-heavy, fat-heavy)
+COACH_RATIO_ADVICE = (
+    None,
+    "Your day leaned more towards **carb-heavy** meals. Try adding some healthy fats (nuts, seeds, ghee in moderation) and protein.",
+    "Your day is a bit **fat-heavy**. Reduce deep-fried and creamy foods and replace them with grilled/steamed options.",
+)
+
+
+# The message only depends on today's aggregates and the goal, so identical
+# inputs (every rerun until a new meal is logged) are served from the cache.
+@functools.lru_cache(maxsize=64)
+def coach_message(goal, meals_count, total_cals, total_protein, total_carbs, total_fat):
+    if goal not in GOAL_CODES:
+        goal = "maintain"
+    cal_bucket, protein_bucket, ratio_flag = classify_day(
+        total_cals, total_protein, total_carbs, total_fat, GOAL_CODES[goal]
+    )
+
+    lines = []
+
+    lines.append(f"📊 You logged **{meals_count}** meal(s) today with about **{total_cals} kcal** in total.")
+    lines.append(
+        f"Approx macros: **Protein** {total_protein:.0f} g, "
+        f"**Carbs** {total_carbs:.0f} g, **Fat** {total_fat:.0f} g."
+    )
+
+    # Calorie analysis
+    lines.append(COACH_CALORIE_ADVICE[goal][cal_bucket])
+
+    # Protein analysis
+    lines.append(COACH_PROTEIN_ADVICE[protein_bucket])
+
+    # Carbs & fat brief check
+    if COACH_RATIO_ADVICE[ratio_flag]:
+        lines.append(COACH_RATIO_ADVICE[ratio_flag])
+
+    # Behaviour advice
+    lines.append(
+        "💡 Tip: Try to spread your calories across the day (breakfast, lunch, dinner, 1–2 snacks) "
+        "instead of having one very heavy meal."
+    )
+
+    return "\n\n".join(lines)
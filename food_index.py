@@ -0,0 +1,62 @@
+# food_index.py
+import re
+from typing import Iterable, Iterator, Optional
+
+# Optional Aho-Corasick automaton (C); falls back to a regex alternation
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class FoodKeyIndex:
+    """
+    Fuzzy lookup over a fixed set of lowercase food keys, built once at import.
+
+    match(query) returns the first key, in the original key order, that either
+    appears inside the query ("veg biryani" -> "biryani") or contains it
+    ("paneer" -> "paneer butter masala") - the same answer as scanning
+    `for k in keys: if query in k or k in query`.
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys = tuple(keys)
+        self._order = {k: i for i, k in enumerate(self.keys)}
+        words = [k for k in self.keys if k]
+        self._automaton = None
+        self._pattern = None
+        if words and ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for k in words:
+                self._automaton.add_word(k, k)
+            self._automaton.make_automaton()
+        elif words:
+            # Zero-width lookahead so every start position is tried (overlapping
+            # keys like "salad" / "dosa" in "saladosa" are both seen); keys stay
+            # in their original order, so each position reports its earliest key
+            self._pattern = re.compile(
+                "(?=(" + "|".join(re.escape(k) for k in words) + "))"
+            )
+
+    def _keys_in(self, query: str) -> Iterator[str]:
+        """Keys occurring inside `query`, in one linear scan of it."""
+        if self._automaton is not None:
+            return (k for _, k in self._automaton.iter(query))
+        if self._pattern is not None:
+            return (m.group(1) for m in self._pattern.finditer(query))
+        return iter(())
+
+    def match(self, query: str) -> Optional[str]:
+        if query in self._order:
+            return query
+
+        # Keys found inside the query: one scan instead of a Python loop over keys
+        best = len(self.keys)
+        for k in self._keys_in(query):
+            best = min(best, self._order[k])
+
+        # A key containing the query also counts if it comes earlier
+        for k in self.keys[:best]:
+            if query in k:
+                return k
+        return self.keys[best] if best < len(self.keys) else None
@@ -2,84 +2,274 @@
 import os
 import io
 import base64
-from typing import Tuple, Dict, List, Optional
+import threading
+from collections import OrderedDict
+from typing import Tuple, Dict, List, Optional, Union
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PIL import Image
 from dotenv import load_dotenv
 
+# Optional faster JPEG encoders (both wrap libjpeg-turbo's SIMD paths)
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Optional Clarifai gRPC client: sends JPEG bytes raw instead of base64 in JSON
+try:
+    from clarifai_grpc.channel.clarifai_channel import ClarifaiChannel
+    from clarifai_grpc.grpc.api import resources_pb2, service_pb2, service_pb2_grpc
+    from clarifai_grpc.grpc.api.status import status_code_pb2
+except ImportError:
+    ClarifaiChannel = None
+
+# Optional C JSON codec for the REST body (a few hundred KB of base64)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load env (for local runs; on Streamlit Cloud, secrets are used)
 load_dotenv()
 
 CLARIFAI_API_KEY = os.getenv("CLARIFAI_API_KEY")
-CLARIFAI_FOOD_MODEL_URL = "https://api.clarifai.com/v2/models/food-item-recognition/outputs"
+CLARIFAI_FOOD_MODEL_ID = "food-item-recognition"
+CLARIFAI_FOOD_MODEL_URL = f"https://api.clarifai.com/v2/models/{CLARIFAI_FOOD_MODEL_ID}/outputs"
+
+# gRPC stub, created on first use; after a failed gRPC call it is not tried
+# again and every request goes straight to the JSON endpoint
+_GRPC_STUB = None
+_GRPC_STUB_LOCK = threading.Lock()
+_GRPC_DISABLED = False
+
+# One keep-alive session for all Clarifai calls, so each prediction reuses a
+# pooled connection instead of a fresh TCP + TLS handshake
+_CLARIFAI_SESSION = requests.Session()
+_CLARIFAI_SESSION.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.2)),
+)
+_CLARIFAI_SESSION.headers.update({
+    "Authorization": f"Key {CLARIFAI_API_KEY}",
+    "Content-Type": "application/json",
+})
 
 # Confidence threshold to consider a prediction valid
 FOOD_CONFIDENCE_THRESHOLD = 0.5
 
+# Recent live-feed predictions kept, keyed by perceptual hash (LRU)
+PREDICT_CACHE_SIZE = 128
+_PREDICT_CACHE: "OrderedDict[bytes, List[Dict]]" = OrderedDict()
+_PREDICT_CACHE_LOCK = threading.Lock()
+
+# Longest edge sent to Clarifai; the food model works at ~224-336 px anyway
+API_MAX_EDGE = 512
+
+# A PIL image (Streamlit uploads) or a BGR uint8 frame (OpenCV webcam)
+ImageInput = Union[Image.Image, np.ndarray]
+
+
+def downscale_for_api(image: ImageInput, max_edge: int = API_MAX_EDGE) -> ImageInput:
+    """Shrink so the longest edge is at most `max_edge`; smaller inputs pass through."""
+    if isinstance(image, np.ndarray):
+        h, w = image.shape[:2]
+        scale = max_edge / max(h, w)
+        if scale >= 1 or cv2 is None:
+            return image
+        new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+        return cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+    if max(image.size) <= max_edge:
+        return image
+    image = image.copy()
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return image
+
+
+def _ensure_rgb(image: Image.Image) -> Image.Image:
+    """convert() always copies the pixels, even RGB -> RGB; skip it when possible."""
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def _to_bgr_ndarray(image: Image.Image) -> np.ndarray:
+    """PIL Image -> contiguous BGR uint8 array (OpenCV channel order)."""
+    return np.ascontiguousarray(np.asarray(_ensure_rgb(image))[:, :, ::-1])
 
-def _image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64-encoded JPEG string."""
+
+def _encode_jpeg(image: ImageInput, quality: int = 90) -> bytes:
+    """
+    Encode a PIL Image or a BGR ndarray as JPEG bytes with the fastest
+    encoder available. BGR frames are encoded as-is, without a PIL round trip.
+    """
+    if isinstance(image, np.ndarray):
+        if simplejpeg is not None:
+            return simplejpeg.encode_jpeg(
+                np.ascontiguousarray(image), quality=quality, colorspace="BGR", fastdct=True
+            )
+        if cv2 is not None:
+            ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if ok:
+                return buf.tobytes()
+        image = Image.fromarray(image[:, :, ::-1])
+
+    image = _ensure_rgb(image)
+    if simplejpeg is not None:
+        return simplejpeg.encode_jpeg(
+            np.asarray(image), quality=quality, colorspace="RGB", fastdct=True
+        )
+    if cv2 is not None:
+        ok, buf = cv2.imencode(".jpg", _to_bgr_ndarray(image), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            return buf.tobytes()
     buffer = io.BytesIO()
-    image = image.convert("RGB")
-    image.save(buffer, format="JPEG", quality=90)
-    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _average_hash(image: ImageInput) -> bytes:
+    """8x8 average hash: one bit per cell, set where it is brighter than the mean."""
+    if isinstance(image, np.ndarray):
+        if cv2 is not None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            cells = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA)
+            return np.packbits(cells > cells.mean()).tobytes()
+        image = Image.fromarray(image[:, :, ::-1])
+    cells = np.asarray(image.convert("L").resize((8, 8), Image.BOX))
+    return np.packbits(cells > cells.mean()).tobytes()
 
 
-def _clarifai_predict(image: Image.Image) -> Optional[List[Dict]]:
+def _clarifai_predict(image: ImageInput, perceptual_cache: bool = False) -> Optional[List[Dict]]:
     """
     Call Clarifai Food model and return a list of concepts.
     Each concept: {"name": "pizza", "value": 0.97}
 
+    With perceptual_cache=True (the live feed), results are cached by the
+    image's average hash, so an unchanged scene doesn't cost another API
+    call. Uploads leave it off: different photos can share a coarse hash.
     Returns None if API key missing or API fails.
     """
     if not CLARIFAI_API_KEY:
         return None
 
+    image = downscale_for_api(image)
+    if not perceptual_cache:
+        return _clarifai_request(image)
+
+    key = _average_hash(image)
+    with _PREDICT_CACHE_LOCK:
+        if key in _PREDICT_CACHE:
+            _PREDICT_CACHE.move_to_end(key)
+            return _PREDICT_CACHE[key]
+
+    concepts = _clarifai_request(image)
+    if concepts is not None:  # don't remember failures, so they get retried
+        with _PREDICT_CACHE_LOCK:
+            _PREDICT_CACHE[key] = concepts
+            if len(_PREDICT_CACHE) > PREDICT_CACHE_SIZE:
+                _PREDICT_CACHE.popitem(last=False)
+    return concepts
+
+
+def _concept_value(concept: Dict) -> float:
+    return concept.get("value") or 0.0
+
+
+def _by_value(concepts: List[Dict]) -> List[Dict]:
+    """
+    Clarifai returns concepts by descending value, so this is normally one
+    linear check; a response out of order is reported and sorted.
+    """
+    values = [_concept_value(c) for c in concepts]
+    if all(a >= b for a, b in zip(values, values[1:])):
+        return concepts
+    print("Clarifai concepts were not sorted by value; sorting them")
+    return sorted(concepts, key=_concept_value, reverse=True)
+
+
+def _clarifai_request(image: ImageInput) -> Optional[List[Dict]]:
+    """Uncached Clarifai call; returns the concepts or None on failure."""
     try:
-        img_b64 = _image_to_base64(image)
-        headers = {
-            "Authorization": f"Key {CLARIFAI_API_KEY}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "inputs": [
-                {
-                    "data": {
-                        "image": {
-                            "base64": img_b64
-                        }
+        jpg = _encode_jpeg(image)
+    except Exception:
+        return None
+    global _GRPC_DISABLED
+    if ClarifaiChannel is not None and not _GRPC_DISABLED:
+        try:
+            return _clarifai_grpc_predict(jpg)
+        except Exception:
+            # e.g. gRPC port blocked; don't wait on (or bill) it again
+            _GRPC_DISABLED = True
+    try:
+        return _clarifai_json_predict(jpg)
+    except Exception:
+        return None
+
+
+def _clarifai_grpc_predict(jpg: bytes) -> List[Dict]:
+    """gRPC call: protobuf carries the JPEG bytes as-is, no base64 step."""
+    global _GRPC_STUB
+    with _GRPC_STUB_LOCK:
+        if _GRPC_STUB is None:
+            _GRPC_STUB = service_pb2_grpc.V2Stub(ClarifaiChannel.get_grpc_channel())
+    request = service_pb2.PostModelOutputsRequest(
+        model_id=CLARIFAI_FOOD_MODEL_ID,
+        inputs=[
+            resources_pb2.Input(
+                data=resources_pb2.Data(image=resources_pb2.Image(base64=jpg))
+            )
+        ],
+    )
+    resp = _GRPC_STUB.PostModelOutputs(
+        request, metadata=(("authorization", f"Key {CLARIFAI_API_KEY}"),), timeout=20
+    )
+    if resp.status.code != status_code_pb2.SUCCESS:
+        raise RuntimeError(resp.status.description)
+    return _by_value([{"name": c.name, "value": c.value} for c in resp.outputs[0].data.concepts])
+
+
+def _clarifai_json_predict(jpg: bytes) -> List[Dict]:
+    """REST call: the JSON body needs the image base64-encoded."""
+    payload = {
+        "inputs": [
+            {
+                "data": {
+                    "image": {
+                        "base64": base64.b64encode(jpg).decode("ascii")
                     }
                 }
-            ]
-        }
+            }
+        ]
+    }
 
-        resp = requests.post(CLARIFAI_FOOD_MODEL_URL, headers=headers, json=payload, timeout=20)
+    if orjson is not None:
+        # Content-Type is already set on the session
+        resp = _CLARIFAI_SESSION.post(
+            CLARIFAI_FOOD_MODEL_URL, data=orjson.dumps(payload), timeout=20
+        )
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+    else:
+        resp = _CLARIFAI_SESSION.post(CLARIFAI_FOOD_MODEL_URL, json=payload, timeout=20)
         resp.raise_for_status()
         data = resp.json()
-        concepts = (
-            data.get("outputs", [{}])[0]
-            .get("data", {})
-            .get("concepts", [])
-        )
-        return concepts
-    except Exception:
-        return None
+    concepts = (
+        data.get("outputs", [{}])[0]
+        .get("data", {})
+        .get("concepts", [])
+    )
+    return _by_value(concepts)
 
 
-def validate_food_image(image: Image.Image) -> Tuple[bool, float]:
-    """
-    Returns (is_food, confidence).
-
-    - If Clarifai is available:
-        - Use the top concept confidence.
-        - If confidence >= threshold → treat as food.
-        - Else → not food / unclear.
-    - If Clarifai is NOT available:
-        - Return (False, 0.0) so the app can warn the developer.
-    """
-    concepts = _clarifai_predict(image)
-    if not concepts:
+def _validate_concepts(concepts: Optional[List[Dict]]) -> Tuple[bool, float]:
+    if not concepts or concepts[0].get("value") is None:
         return False, 0.0
 
     top = concepts[0]
@@ -89,30 +279,14 @@ def validate_food_image(image: Image.Image) -> Tuple[bool, float]:
     return is_food, confidence
 
 
-def recognize_food_advanced(image: Image.Image) -> Dict:
-    """
-    Detect food name and confidence.
-
-    Returns:
-      {
-        "name": "pizza" or "unknown",
-        "confidence": 0.92,
-        "alternatives": ["cheese pizza", "margherita", ...]
-      }
-
-    If not confident enough or API fails → name="unknown".
-    """
-    concepts = _clarifai_predict(image)
-
-    if not concepts:
+def _recognize_concepts(concepts: Optional[List[Dict]]) -> Dict:
+    if not concepts or concepts[0].get("value") is None:
         return {
             "name": "unknown",
             "confidence": 0.0,
             "alternatives": [],
         }
 
-    # Sort concepts by confidence
-    concepts = sorted(concepts, key=lambda c: c.get("value", 0.0), reverse=True)
     main = concepts[0]
     food_name = main.get("name", "unknown")
     confidence = float(main.get("value", 0.0))
@@ -125,9 +299,7 @@ def recognize_food_advanced(image: Image.Image) -> Dict:
         }
 
     alternatives = [
-        c.get("name", "")
-        for c in concepts[1:6]
-        if c.get("name") and float(c.get("value", 0.0)) >= 0.2
+        c["name"] for c in concepts[1:6] if c.get("name") and (c.get("value") or 0) >= 0.2
     ]
 
     return {
@@ -135,3 +307,56 @@ def recognize_food_advanced(image: Image.Image) -> Dict:
         "confidence": confidence,
         "alternatives": alternatives,
     }
+
+
+def validate_food_image(image: ImageInput) -> Tuple[bool, float]:
+    """
+    Returns (is_food, confidence).
+
+    - If Clarifai is available:
+        - Use the top concept confidence.
+        - If confidence >= threshold → treat as food.
+        - Else → not food / unclear.
+    - If Clarifai is NOT available:
+        - Return (False, 0.0) so the app can warn the developer.
+    """
+    return _validate_concepts(_clarifai_predict(image))
+
+
+def recognize_food_advanced(image: ImageInput) -> Dict:
+    """
+    Detect food name and confidence.
+
+    Returns:
+      {
+        "name": "pizza" or "unknown",
+        "confidence": 0.92,
+        "alternatives": ["cheese pizza", "margherita", ...]
+      }
+
+    If not confident enough or API fails → name="unknown".
+    """
+    return _recognize_concepts(_clarifai_predict(image))
+
+
+def analyze_food(
+    image: ImageInput, raise_on_error: bool = False, perceptual_cache: bool = False
+) -> Tuple[bool, str, float, List[str]]:
+    """
+    Validation + recognition from a single Clarifai call.
+
+    Returns (is_food, name, confidence, alternatives):
+      - is_food as in validate_food_image
+      - name / confidence / alternatives as in recognize_food_advanced
+
+    With raise_on_error=True a missing key or failed API call raises
+    RuntimeError instead of returning the "unknown" result, so callers that
+    cache results don't remember the failure. perceptual_cache is passed
+    through to _clarifai_predict (meant for the live webcam feed).
+    """
+    concepts = _clarifai_predict(image, perceptual_cache)
+    if concepts is None and raise_on_error:
+        raise RuntimeError("Clarifai prediction failed (API key missing or request error)")
+    is_food, _ = _validate_concepts(concepts)
+    detection = _recognize_concepts(concepts)
+    return is_food, detection["name"], detection["confidence"], detection["alternatives"]
@@ -0,0 +1,14 @@
+# kernels.py
+"""
+Shared pieces for the numeric kernels in coach.py and recommendations.py:
+the optional numba decorator and the integer goal codes the kernels take.
+"""
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; without it the kernels run as plain Python
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
+# Any other goal is treated as "maintain"
+GOAL_CODES = {"lose": 0, "maintain": 1, "gain": 2}
@@ -4,20 +4,75 @@ ScanEat Live - desktop script using OpenCV.
 Shows live webcam feed with detected food name and approximate calories.
 """
 
+import sys
 import time
+import queue
+import threading
+from typing import Optional, Tuple
 
 import cv2
-from PIL import Image
+import numpy as np
 from dotenv import load_dotenv
 
-from food_recognition import recognize_food_advanced, validate_food_image
+from food_recognition import analyze_food, downscale_for_api
 from nutrition_api import get_nutrition_info
 
 load_dotenv()
 
+OVERLAY_HEIGHT = 60  # px; the caption strip at the top of the frame
+
+
+def _open_camera(index: int = 0) -> "cv2.VideoCapture":
+    """
+    Open the webcam with the platform's native backend, a 1-frame buffer
+    (reads never return stale frames after a slow tick) and MJPG so the
+    camera streams compressed frames that cv2 decodes with libjpeg-turbo.
+    """
+    if sys.platform.startswith("linux"):
+        backend = cv2.CAP_V4L2
+    elif sys.platform == "win32":
+        backend = cv2.CAP_DSHOW
+    elif sys.platform == "darwin":
+        backend = cv2.CAP_AVFOUNDATION
+    else:
+        backend = cv2.CAP_ANY
+
+    cap = cv2.VideoCapture(index, backend)
+    if not cap.isOpened():
+        cap = cv2.VideoCapture(index)  # let OpenCV pick any backend
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+    return cap
+
+
+def _predict(frame) -> Tuple[str, float, Optional[int]]:
+    """One prediction for a BGR frame; runs on the worker thread. Returns (label, conf, kcal)."""
+    # The frame is shrunk and JPEG-encoded directly; no RGB/PIL copies.
+    # One Clarifai call covers both the food check and the recognition; a
+    # still scene hits the perceptual-hash cache instead of the API.
+    is_food, name, c, _ = analyze_food(downscale_for_api(frame), perceptual_cache=True)
+    if not is_food or c < 0.5:
+        return "Not clear / not recognized as food", 0.0, None
+    if name == "unknown":
+        return "Could not detect specific food", 0.0, None
+    n = get_nutrition_info(name)
+    return name, c, (n["calories"] if n else None)
+
+
+def _predict_worker(jobs: "queue.Queue", results: "queue.Queue") -> None:
+    """Worker loop: one frame in, one (label, conf, kcal) tuple or exception out."""
+    while True:
+        frame = jobs.get()
+        try:
+            results.put(_predict(frame))
+        except Exception as e:
+            results.put(e)
+
 
 def main():
-    cap = cv2.VideoCapture(0)  # default webcam
+    cap = _open_camera(0)  # default webcam
 
     if not cap.isOpened():
         print("Error: Could not open webcam.")
@@ -30,58 +85,67 @@ def main():
     current_conf = 0.0
     current_cals = None
 
+    overlay = None  # caption strip drawn over the top of each frame
+    overlay_text = None
+
+    # Predictions run on a single daemon worker so the camera loop never waits
+    # on the API, and quitting doesn't wait for a request still in flight
+    jobs: "queue.Queue" = queue.Queue(maxsize=1)
+    results: "queue.Queue" = queue.Queue(maxsize=1)
+    threading.Thread(target=_predict_worker, args=(jobs, results), daemon=True).start()
+    pending = False
+
     while True:
         ret, frame = cap.read()
         if not ret:
             break
 
+        # Pick up a finished prediction without blocking
+        if pending:
+            try:
+                result = results.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                pending = False
+                if isinstance(result, Exception):
+                    print(f"Prediction error: {result}")
+                else:
+                    current_label, current_conf, current_cals = result
+
+        now = time.time()
+        if not pending and now - last_prediction_time > prediction_interval:
+            last_prediction_time = now
+            # Copy before the overlay is drawn, so the label text isn't sent to Clarifai
+            jobs.put(frame.copy())
+            pending = True
+
         text = current_label
         if current_conf > 0:
             text = f"{current_label} ({current_conf*100:.1f}%)"
         if current_cals is not None:
             text = f"{text} · ~{current_cals} kcal"
 
-        cv2.putText(
-            frame,
-            text,
-            (20, 40),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.7,
-            (0, 255, 0),
-            2,
-        )
+        # Text is rendered only when it changes; each frame just copies the strip
+        if overlay is None or overlay.shape[1] != frame.shape[1]:
+            overlay = np.zeros((OVERLAY_HEIGHT, frame.shape[1], 3), dtype=np.uint8)
+            overlay_text = None
+        if text != overlay_text:
+            overlay[:] = 0
+            cv2.putText(
+                overlay,
+                text,
+                (20, 40),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.7,
+                (0, 255, 0),
+                2,
+            )
+            overlay_text = text
+        frame[:OVERLAY_HEIGHT] = overlay
 
         cv2.imshow("ScanEat Live - Press Q to quit", frame)
 
-        now = time.time()
-        if now - last_prediction_time > prediction_interval:
-            last_prediction_time = now
-
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(frame_rgb)
-
-            is_food, conf = validate_food_image(pil_img)
-            if not is_food or conf < 0.5:
-                current_label = "Not clear / not recognized as food"
-                current_conf = 0.0
-                current_cals = None
-            else:
-                result = recognize_food_advanced(pil_img)
-                name = result.get("name", "unknown")
-                c = result.get("confidence", 0.0)
-                if name == "unknown" or c < 0.5:
-                    current_label = "Could not detect specific food"
-                    current_conf = 0.0
-                    current_cals = None
-                else:
-                    current_label = name
-                    current_conf = c
-                    n = get_nutrition_info(name)
-                    if n:
-                        current_cals = n["calories"]
-                    else:
-                        current_cals = None
-
         if cv2.waitKey(1) & 0xFF == ord("q"):
             break
 
@@ -1,6 +1,18 @@
 # nutrition_api.py
+import os
+import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
 import requests
-from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from food_index import FoodKeyIndex
 
 # Local nutrition database (kept as-is for fast lookups)
 LOCAL_NUTRITION_DB: Dict[str, Dict] = {
@@ -88,20 +100,42 @@ LOCAL_NUTRITION_DB: Dict[str, Dict] = {
 }
 
 
+# Keep-alive session for Open Food Facts: pooled connections, retries on
+# connection errors, and the User-Agent OFF asks clients to send
+_OFF_SESSION = requests.Session()
+_OFF_SESSION.mount(
+    "https://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.2)),
+)
+_OFF_SESSION.headers.update({"User-Agent": "scanEat/1.0 (workforsunil0@gmail.com)"})
+
+
 def _normalize(food_name: str) -> str:
     """Normalize food name for matching"""
     return food_name.strip().lower()
 
 
+# Built once: the local DB never changes at runtime
+_LOCAL_INDEX = FoodKeyIndex(LOCAL_NUTRITION_DB)
+
+
 def _lookup_local(food_name: str) -> Optional[Dict]:
     """Search local database first"""
-    key = _normalize(food_name)
-    if key in LOCAL_NUTRITION_DB:
-        return LOCAL_NUTRITION_DB[key]
-    for k, v in LOCAL_NUTRITION_DB.items():
-        if key in k or k in key:
-            return v
-    return None
+    return _lookup_local_key(_normalize(food_name))
+
+
+@lru_cache(maxsize=256)
+def _lookup_local_key(key: str) -> Optional[Dict]:
+    match = _LOCAL_INDEX.match(key)
+    return LOCAL_NUTRITION_DB[match] if match else None
+
+
+# Per-100g nutriment fields read from an OFF product, in unpacking order
+_OFF_KEYS = (
+    'energy-kcal_100g', 'proteins_100g', 'carbohydrates_100g', 'fat_100g', 'fiber_100g',
+    'vitamin-a_100g', 'vitamin-c_100g',
+    'calcium_100g', 'iron_100g', 'sodium_100g', 'potassium_100g',
+)
 
 
 def _fetch_from_openfoodfacts(food_name: str) -> Optional[Dict]:
@@ -109,10 +143,6 @@ def _fetch_from_openfoodfacts(food_name: str) -> Optional[Dict]:
     Fetch nutrition data from Open Food Facts API (FREE - no API key needed!)
     """
     try:
-        headers = {
-            'User-Agent': 'scanEat/1.0 (workforsunil0@gmail.com)' 
-        }
-        
         # Search for the food product
         search_url = f"https://world.openfoodfacts.org/cgi/search.pl"
         params = {
@@ -120,34 +150,35 @@ def _fetch_from_openfoodfacts(food_name: str) -> Optional[Dict]:
             'search_simple': 1,
             'action': 'process',
             'json': 1,
-            'page_size': 1
+            'page_size': 5
         }
         
-        resp = requests.get(search_url, params=params, headers=headers, timeout=10)
+        resp = _OFF_SESSION.get(search_url, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         
-        # Check if we got results
-        if not data.get('products') or len(data['products']) == 0:
+        # Take the first result that actually has calories; OFF's top hit
+        # often has empty nutriments on ambiguous search terms
+        product = next(
+            (
+                p for p in data.get('products') or []
+                if (p.get('nutriments') or {}).get('energy-kcal_100g') is not None
+            ),
+            None,
+        )
+        if product is None:
             return None
-        
-        product = data['products'][0]
-        nutriments = product.get('nutriments', {})
+        nutriments = product['nutriments']
         
         # Extract nutrition per 100g
-        def get_nutrient(key: str, default: float = 0.0) -> float:
-            return float(nutriments.get(f"{key}_100g", default))
-        
-        calories = int(get_nutrient('energy-kcal'))
-        protein = get_nutrient('proteins')
-        carbs = get_nutrient('carbohydrates')
-        fat = get_nutrient('fat')
-        fiber = get_nutrient('fiber')
-        
+        (
+            calories, protein, carbs, fat, fiber,
+            vit_a, vit_c, calcium, iron, sodium, potassium,
+        ) = [float(nutriments.get(k, 0.0)) for k in _OFF_KEYS]
+        calories = int(calories)
+
         # Vitamins (if available)
         vitamins = {}
-        vit_a = get_nutrient('vitamin-a')
-        vit_c = get_nutrient('vitamin-c')
         if vit_a > 0:
             vitamins['Vit A'] = f"{vit_a:.1f} µg"
         if vit_c > 0:
@@ -155,11 +186,6 @@ def _fetch_from_openfoodfacts(food_name: str) -> Optional[Dict]:
         
         # Minerals (if available)
         minerals = {}
-        calcium = get_nutrient('calcium')
-        iron = get_nutrient('iron')
-        sodium = get_nutrient('sodium')
-        potassium = get_nutrient('potassium')
-        
         if calcium > 0:
             minerals['Calcium'] = f"{calcium:.1f} mg"
         if iron > 0:
@@ -184,6 +210,82 @@ def _fetch_from_openfoodfacts(food_name: str) -> Optional[Dict]:
         return None
 
 
+# Open Food Facts results cache: bounded LRU with a TTL, saved to disk on exit
+# so a restarted app starts warm.
+OFF_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".off_cache.json")
+OFF_CACHE_TTL = 24 * 3600  # seconds
+OFF_CACHE_SIZE = 512
+_OFF_CACHE: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+_OFF_CACHE_LOCK = threading.Lock()
+
+
+def _load_off_cache() -> None:
+    """Warm the cache from disk; a missing or malformed file (or entry) is skipped."""
+    try:
+        with open(OFF_CACHE_PATH, encoding="utf-8") as f:
+            saved = json.load(f)
+        items = saved.items()
+    except (OSError, ValueError, AttributeError):
+        return
+
+    now = time.time()
+    fresh = []
+    for name, entry in items:
+        try:
+            ts, result = entry
+            ts = float(ts)
+        except (TypeError, ValueError):
+            continue
+        if isinstance(result, dict) and now - ts < OFF_CACHE_TTL:
+            fresh.append((ts, name, result))
+
+    # Oldest first, as in the live LRU; keep only the newest OFF_CACHE_SIZE
+    fresh.sort(key=lambda e: e[0])
+    for ts, name, result in fresh[-OFF_CACHE_SIZE:]:
+        _OFF_CACHE[name] = (ts, result)
+
+
+def _save_off_cache() -> None:
+    with _OFF_CACHE_LOCK:
+        snapshot = dict(_OFF_CACHE)
+    if not snapshot:
+        return
+    try:
+        tmp_path = OFF_CACHE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, OFF_CACHE_PATH)
+    except OSError as e:
+        print(f"Could not save Open Food Facts cache: {e}")
+
+
+def _fetch_from_openfoodfacts_cached(food_name: str) -> Optional[Dict]:
+    """
+    _fetch_from_openfoodfacts behind the TTL/LRU cache.
+    Misses and errors (None) are not cached, so they are retried next time.
+    """
+    key = _normalize(food_name)
+    with _OFF_CACHE_LOCK:
+        hit = _OFF_CACHE.get(key)
+        if hit is not None:
+            if time.time() - hit[0] < OFF_CACHE_TTL:
+                _OFF_CACHE.move_to_end(key)
+                return hit[1]
+            del _OFF_CACHE[key]
+
+    result = _fetch_from_openfoodfacts(key)
+    if result is not None:
+        with _OFF_CACHE_LOCK:
+            _OFF_CACHE[key] = (time.time(), result)
+            if len(_OFF_CACHE) > OFF_CACHE_SIZE:
+                _OFF_CACHE.popitem(last=False)
+    return result
+
+
+_load_off_cache()
+atexit.register(_save_off_cache)
+
+
 def get_nutrition_info(food_name: str) -> Optional[Dict]:
     """
     Priority order:
@@ -197,8 +299,16 @@ def get_nutrition_info(food_name: str) -> Optional[Dict]:
         return local
     
     # Try Open Food Facts API (free!)
-    api_data = _fetch_from_openfoodfacts(food_name)
+    api_data = _fetch_from_openfoodfacts_cached(food_name)
     if api_data:
         return api_data
     
     return None
+
+
+def get_nutrition_info_many(food_names: List[str]) -> List[Optional[Dict]]:
+    """
+    Batch variant of get_nutrition_info: one result (or None) per name, in order.
+    Single entry point so the per-item loop can later become one bulk request.
+    """
+    return [get_nutrition_info(name) for name in food_names]
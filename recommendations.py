@@ -1,6 +1,10 @@
 # recommendations.py
+import re
 from typing import Dict, List
 
+from food_index import FoodKeyIndex
+from kernels import GOAL_CODES, njit
+
 HEALTHIER_ALTERNATIVES_MAP = {
     "pizza": [
         "Thin-crust veggie pizza with less cheese.",
@@ -49,87 +53,110 @@ HEALTHIER_ALTERNATIVES_MAP = {
     ],
 }
 
+_ALTERNATIVES_INDEX = FoodKeyIndex(HEALTHIER_ALTERNATIVES_MAP)
 
-def get_meal_recommendations(food_name: str, nutrition: Dict, goal: str) -> List[str]:
-    recs: List[str] = []
 
-    calories = nutrition.get("calories", 0)
-    protein = nutrition.get("protein", 0.0)
-    carbs = nutrition.get("carbs", 0.0)
-    fat = nutrition.get("fat", 0.0)
-    fiber = nutrition.get("fiber", 0.0)
+# Tip table: bit i of the _score() mask selects TIPS[i]. Order matches the
+# order tips are shown in; "{calories}" is filled in only for selected tips.
+TIPS = (
+    # lose
+    "This looks like a high-calorie meal (~{calories} kcal). "
+    "For weight loss, reduce portion size, share it, or balance with very light meals.",
+    "At around {calories} kcal, this can fit a weight loss plan "
+    "if your daily calories remain in deficit.",
+    "Fat is on the higher side. Avoid adding extra ghee, butter, or fried sides.",
+    "Fiber is low. Add salad, fruits, or vegetables with this meal to stay full longer.",
+    # gain
+    "This meal has only ~{calories} kcal. For healthy weight gain, "
+    "consider adding an extra roti, rice, or a protein-rich side.",
+    "With ~{calories} kcal, this supports a calorie surplus if combined with your other meals.",
+    "Protein is on the lower side. For muscle gain, add paneer, lentils, eggs, or whey.",
+    # maintain
+    "With ~{calories} kcal, this can fit into a balanced diet "
+    "if your overall daily intake is around your maintenance level.",
+    "Fat is slightly high. Reduce cream-based gravies or deep-fried items.",
+    "Carbs are high. Balance with more protein and fiber in other meals.",
+    # general
+    "Add a protein-rich side (dal, paneer, chana, rajma, eggs) to make this meal more filling and muscle-friendly.",
+    "Very low fiber. Add salad, fruits, or whole grains for better digestion and satiety.",
+)
+
+_HEAVY_FOOD_TIP = (
+    "Try to avoid very heavy, oily foods late at night. If you eat this for dinner, keep the portion small."
+)
+_LIGHT_FOOD_TIP = (
+    "This can be a good choice for breakfast or dinner when paired with some protein."
+)
+
+# Time-of-day style hints, matched against the food name
+_HEAVY_RE = re.compile(r"biryani|butter|fried")
+_LIGHT_RE = re.compile(r"salad|idli|dosa")
+
+
+@njit(cache=True)
+def _score(calories, protein, carbs, fat, fiber, goal_code):
+    """Numeric gating only: returns a bitmask of the TIPS that apply."""
+    mask = 0
 
     # Goal-specific guidance
-    if goal == "lose":
+    if goal_code == 0:
         if calories > 600:
-            recs.append(
-                f"This looks like a high-calorie meal (~{calories} kcal). "
-                "For weight loss, reduce portion size, share it, or balance with very light meals."
-            )
+            mask |= 1 << 0
         else:
-            recs.append(
-                f"At around {calories} kcal, this can fit a weight loss plan "
-                "if your daily calories remain in deficit."
-            )
+            mask |= 1 << 1
         if fat > 20:
-            recs.append("Fat is on the higher side. Avoid adding extra ghee, butter, or fried sides.")
+            mask |= 1 << 2
         if fiber < 3:
-            recs.append("Fiber is low. Add salad, fruits, or vegetables with this meal to stay full longer.")
-    elif goal == "gain":
+            mask |= 1 << 3
+    elif goal_code == 2:
         if calories < 400:
-            recs.append(
-                f"This meal has only ~{calories} kcal. For healthy weight gain, "
-                "consider adding an extra roti, rice, or a protein-rich side."
-            )
+            mask |= 1 << 4
         else:
-            recs.append(
-                f"With ~{calories} kcal, this supports a calorie surplus if combined with your other meals."
-            )
+            mask |= 1 << 5
         if protein < 15:
-            recs.append(
-                "Protein is on the lower side. For muscle gain, add paneer, lentils, eggs, or whey."
-            )
-    else:  # maintain
-        recs.append(
-            f"With ~{calories} kcal, this can fit into a balanced diet "
-            "if your overall daily intake is around your maintenance level."
-        )
+            mask |= 1 << 6
+    else:
+        mask |= 1 << 7
         if fat > 25:
-            recs.append("Fat is slightly high. Reduce cream-based gravies or deep-fried items.")
+            mask |= 1 << 8
         if carbs > 50:
-            recs.append("Carbs are high. Balance with more protein and fiber in other meals.")
+            mask |= 1 << 9
 
     # General tips
     if protein < 10:
-        recs.append(
-            "Add a protein-rich side (dal, paneer, chana, rajma, eggs) to make this meal more filling and muscle-friendly."
-        )
+        mask |= 1 << 10
     if fiber < 2:
-        recs.append(
-            "Very low fiber. Add salad, fruits, or whole grains for better digestion and satiety."
-        )
+        mask |= 1 << 11
+
+    return mask
+
+
+def get_meal_recommendations(food_name: str, nutrition: Dict, goal: str) -> List[str]:
+    calories = nutrition.get("calories", 0)
+    protein = nutrition.get("protein", 0.0)
+    carbs = nutrition.get("carbs", 0.0)
+    fat = nutrition.get("fat", 0.0)
+    fiber = nutrition.get("fiber", 0.0)
+
+    mask = _score(calories, protein, carbs, fat, fiber, GOAL_CODES.get(goal, GOAL_CODES["maintain"]))
+    recs: List[str] = [
+        TIPS[i].format(calories=calories) for i in range(len(TIPS)) if mask & (1 << i)
+    ]
 
     food_key = food_name.lower()
     # Time-of-day style hints
-    if "biryani" in food_key or "butter" in food_key or "fried" in food_key:
-        recs.append(
-            "Try to avoid very heavy, oily foods late at night. If you eat this for dinner, keep the portion small."
-        )
-    if "salad" in food_key or "idli" in food_key or "dosa" in food_key:
-        recs.append(
-            "This can be a good choice for breakfast or dinner when paired with some protein."
-        )
+    if _HEAVY_RE.search(food_key):
+        recs.append(_HEAVY_FOOD_TIP)
+    if _LIGHT_RE.search(food_key):
+        recs.append(_LIGHT_FOOD_TIP)
 
     return recs
 
 
 def get_healthier_alternatives(food_name: str) -> List[str]:
-    key = food_name.strip().lower()
-    if key in HEALTHIER_ALTERNATIVES_MAP:
-        return HEALTHIER_ALTERNATIVES_MAP[key]
-    for k, v in HEALTHIER_ALTERNATIVES_MAP.items():
-        if key in k or k in key:
-            return v
+    match = _ALTERNATIVES_INDEX.match(food_name.strip().lower())
+    if match:
+        return HEALTHIER_ALTERNATIVES_MAP[match]
     return [
         "Reduce portion size slightly and add more salad or vegetables.",
         "Avoid sugary drinks with this meal; choose water, buttermilk, or lemon water.",